@@ -0,0 +1,454 @@
+"""
+Benchmarks and accuracy checks for the conversion functions in `constants`
+
+Run as a script to print per-call timings and float32 errors:
+
+    python benchmarks.py
+
+or run one benchmark, e.g. the full suite over input sizes and dtypes with
+a comparison against a stored baseline:
+
+    python benchmarks.py suite --output results.json --baseline base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+import constants
+
+
+def time_call(func, arg, number=200000):
+    """
+    Time a single-argument call
+    
+    Parameters
+    ----------
+    func : callable
+        Function to time
+    arg : object
+        Argument passed to `func`
+    number : int, optional
+        Number of calls to make (default: 200000)
+    
+    Returns
+    -------
+    t : float
+        Best time per call over five repeats [s]
+    """
+    times = timeit.repeat(lambda: func(arg), number=number, repeat=5)
+    return min(times) / number
+
+
+def bench_scalar_fast_path():
+    """
+    Compare the scalar fast path with the equivalent NumPy expression
+    """
+    conv = constants.converter('n')
+    cases = [
+        ('E_to_lambda', conv.E_to_lambda,
+         lambda E: conv._c_E_lambda / np.sqrt(E)),
+        ('E_to_p', conv.E_to_p, lambda E: conv._c_E_p * np.sqrt(E)),
+        ('E_to_v', conv.E_to_v, lambda E: conv._c_E_v * np.sqrt(E)),
+    ]
+    print("Scalar fast path (Python float input)")
+    for name, fast, slow in cases:
+        t_fast = time_call(fast, 5.11)
+        t_slow = time_call(slow, 5.11)
+        print(f"  {name:<12} math: {t_fast*1e9:7.1f} ns   "
+              f"numpy: {t_slow*1e9:7.1f} ns   speedup: {t_slow/t_fast:4.1f}x")
+
+
+def check_float32_accuracy(n=10**6, rtol=1e-6):
+    """
+    Compare float32 conversions against the float64 reference
+    
+    Every pair of quantities is converted from float32 inputs spanning
+    0.01-1000 meV, and compared with the float64 conversion of the same
+    (float32-representable) inputs.
+    
+    Parameters
+    ----------
+    n : int, optional
+        Number of input values (default: 10**6)
+    rtol : float, optional
+        Largest acceptable relative error (default: 1e-6)
+    
+    Returns
+    -------
+    ok : bool
+        True if every conversion stayed float32 and within `rtol`
+    """
+    E = np.geomspace(0.01, 1000, n)
+    ok = True
+    print(f"float32 accuracy (max relative error, rtol={rtol:g})")
+    for src in constants.QUANTITIES:
+        x32 = constants.convert(E, 'E', src).astype(np.float32)
+        x64 = x32.astype(np.float64)
+        for dst in constants.QUANTITIES:
+            y32 = constants.convert(x32, src, dst)
+            y64 = constants.convert(x64, src, dst)
+            err = np.max(np.abs(y32 / y64 - 1))
+            good = y32.dtype == np.float32 and err < rtol
+            ok = ok and good
+            print(f"  {src:>6} -> {dst:<6} {y32.dtype}  {err:.2e}"
+                  f"{'' if good else '  FAIL'}")
+    return ok
+
+
+def _time_python(code, repeat):
+    """
+    Best wall time of running `code` in a fresh interpreter [s]
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-c', code]
+    return min(timeit.repeat(lambda: subprocess.run(command, cwd=cwd,
+                                                    check=True),
+                             number=1, repeat=repeat))
+
+def bench_import(repeat=10):
+    """
+    Time `import constants` in a fresh interpreter
+    
+    The interpreter start-up time is subtracted, and NumPy is checked not to
+    be imported until it is needed.
+    
+    Parameters
+    ----------
+    repeat : int, optional
+        Number of interpreters started per measurement (default: 10)
+    
+    Returns
+    -------
+    ok : bool
+        True if importing constants left NumPy unimported
+    """
+    startup = _time_python('pass', repeat)
+    cases = [
+        ('import constants', 'import constants'),
+        ('constant access', 'import constants; constants.mn * constants.h'),
+        ('scalar convert', 'import constants; constants.E_to_lambda(5.0)'),
+        ('array convert',
+         'import constants; constants.E_to_lambda([1.0, 2.0])'),
+        ('import numpy', 'import numpy'),
+    ]
+    print("Import time (fresh interpreter, start-up subtracted)")
+    for name, code in cases:
+        t = _time_python(code, repeat) - startup
+        print(f"  {name:<18} {t*1e3:8.1f} ms")
+    
+    check = subprocess.run(
+        [sys.executable, '-c',
+         "import sys, constants; constants.E_to_v(5.0); "
+         "print('numpy' in sys.modules)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+        capture_output=True, text=True)
+    lazy = check.stdout.strip() == 'False'
+    print(f"  NumPy imported lazily: {lazy}")
+    return lazy
+
+
+def bench_jit(sizes=(10**3, 10**5, 10**7), rtol=1e-12):
+    """
+    Compare the JIT and NumPy backends on conversions and kinematics
+    
+    Parameters
+    ----------
+    sizes : sequence of int, optional
+        Array sizes to time (default: 10**3, 10**5, 10**7)
+    rtol : float, optional
+        Largest acceptable relative difference between the backends
+        (default: 1e-12)
+    
+    Returns
+    -------
+    ok : bool
+        True if the backends agree within `rtol`
+    """
+    import jit
+    import kinematics
+    
+    print(f"JIT backend available: {jit.AVAILABLE}")
+    rng = np.random.default_rng(0)
+    n_pixels = 1000
+    geometry = kinematics.DirectGeometry(
+        10.0, rng.uniform(3, 4, n_pixels), rng.uniform(0.1, 2.5, n_pixels))
+    cases = [
+        ('E -> lambda', lambda E, tof, pixel: constants.convert(E, 'E', 'lambda'),
+         lambda E, tof, pixel: jit.convert(E, 'E', 'lambda')),
+        ('E -> v', lambda E, tof, pixel: constants.convert(E, 'E', 'v'),
+         lambda E, tof, pixel: jit.convert(E, 'E', 'v')),
+        ('lambda -> E', lambda E, tof, pixel: constants.convert(tof, 'lambda', 'E'),
+         lambda E, tof, pixel: jit.convert(tof, 'lambda', 'E')),
+        ('Q_omega', lambda E, tof, pixel: geometry.Q_omega(50.0, tof, pixel)[0],
+         lambda E, tof, pixel: jit.direct_Q_omega(geometry, 50.0, tof, pixel)[0]),
+    ]
+    ok = True
+    for size in sizes:
+        E = rng.uniform(1, 40, size)
+        pixel = rng.integers(0, n_pixels, size)
+        tof = (10 / constants.E_to_v(50.0)
+               + geometry.L2[pixel] / constants.E_to_v(E))
+        for name, numpy_func, jit_func in cases:
+            expected = numpy_func(E, tof, pixel)
+            result = jit_func(E, tof, pixel)   # Also compiles the kernel
+            err = np.max(np.abs(result / expected - 1))
+            ok = ok and err < rtol
+            number = max(1, 10**6 // size)
+            t_numpy = min(timeit.repeat(lambda: numpy_func(E, tof, pixel),
+                                        number=number, repeat=3)) / number
+            t_jit = min(timeit.repeat(lambda: jit_func(E, tof, pixel),
+                                      number=number, repeat=3)) / number
+            print(f"  {name:<12} {size:>10}  numpy: {t_numpy*1e3:9.3f} ms  "
+                  f"jit: {t_jit*1e3:9.3f} ms  speedup: {t_numpy/t_jit:5.1f}x"
+                  f"  max rel diff: {err:.1e}")
+    return ok
+
+
+def bench_pipeline(n_packets=2000, packet_size=4096, batch_size=2**16):
+    """
+    Measure sustained throughput of the asyncio live-reduction pipeline
+    
+    A stand-in publisher on a local socket sends packets of time-of-flight
+    events as fast as the consumer accepts them.
+    
+    Parameters
+    ----------
+    n_packets : int, optional
+        Number of packets published (default: 2000)
+    packet_size : int, optional
+        Events per packet (default: 4096)
+    batch_size : int, optional
+        Events per batch handed to the worker thread (default: 2**16)
+    
+    Returns
+    -------
+    ok : bool
+        True if every published event was histogrammed
+    """
+    import live
+    
+    rng = np.random.default_rng(0)
+    L = rng.uniform(20, 21, 1000)
+    pixel = rng.integers(0, L.size, packet_size)
+    wavelength = rng.uniform(1e-10, 6e-10, packet_size)
+    tof = L[pixel] / constants.convert(wavelength, 'lambda', 'v')
+    packet = live.encode_packet(tof, pixel)
+    
+    async def publish(reader, writer):
+        for _ in range(n_packets):
+            writer.write(packet)
+            await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+    
+    async def run(path):
+        server = await asyncio.start_unix_server(publish, path)
+        accumulator = live.EventAccumulator(
+            {'lambda': ('lambda', 1e-10, 6e-10, 1000),
+             'E': ('E', 0, 100, 1000)}, L)
+        start = time.perf_counter()
+        n_events = await live.consume_socket(path, accumulator, batch_size)
+        elapsed = time.perf_counter() - start
+        server.close()
+        await server.wait_closed()
+        return n_events, elapsed, accumulator.snapshot()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        n_events, elapsed, snapshot = asyncio.run(run(os.path.join(tmp,
+                                                                   'events')))
+    print("Live pipeline (local socket publisher -> asyncio -> worker)")
+    print(f"  {n_events} events in {elapsed:.3f} s: "
+          f"{n_events/elapsed:.4g} events/s")
+    return (n_events == n_packets * packet_size
+            and snapshot.n_events == n_events)
+
+
+# Functions in the suite, with the quantity (range of values) they take
+SUITE = [
+    ('lambda_to_E', 'lambda'),
+    ('E_to_lambda', 'E'),
+    ('lambda_to_p', 'lambda'),
+    ('p_to_lambda', 'p'),
+    ('E_to_p', 'E'),
+    ('p_to_E', 'p'),
+    ('v_to_E', 'v'),
+    ('E_to_v', 'E'),
+]
+
+SIZES = [10, 10**3, 10**5, 10**6, 10**7, 10**8]
+
+
+def _inputs(quantity, size, dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    E = rng.uniform(0.1, 100, size)
+    return constants.convert(E, 'E', quantity).astype(dtype)
+
+def _measure(func, arg):
+    """
+    Best time per call and peak memory allocated by one call
+    """
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    t = min(timer.repeat(repeat=3, number=number)) / number
+    
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t, peak
+
+def run_suite(max_size=10**6):
+    """
+    Time every converter on scalars and arrays for float32 and float64
+    
+    Parameters
+    ----------
+    max_size : int, optional
+        Largest array size to time (default: 10**6)
+    
+    Returns
+    -------
+    results : list of dict
+        One entry per function, dtype and size with the time per call [s],
+        throughput [elements/s] and peak memory allocated [bytes]
+    """
+    results = []
+    
+    def record(name, dtype, size, func, arg):
+        t, peak = _measure(func, arg)
+        results.append({'function': name, 'dtype': dtype, 'size': size,
+                        'time': t, 'throughput': size / t,
+                        'peak_memory': peak})
+        print(f"  {name:<16} {dtype:<8} {size:>10} {t*1e6:12.3f} us "
+              f"{size/t:12.4g} el/s {peak/2**20:10.2f} MiB")
+    
+    print("Benchmark suite")
+    record('get_species_mass', 'str', 1, constants.get_species_mass, 'He-3')
+    for name, quantity in SUITE:
+        func = getattr(constants, name)
+        scalar = float(_inputs(quantity, 1, np.float64)[0])
+        record(name, 'float', 1, func, scalar)
+        for dtype in ('float32', 'float64'):
+            for size in SIZES:
+                if size > max_size:
+                    break
+                record(name, dtype, size, func, _inputs(quantity, size, dtype))
+    return results
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare suite results against a baseline
+    
+    Parameters
+    ----------
+    results, baseline : list of dict
+        Results of `run_suite`
+    tolerance : float, optional
+        Largest acceptable relative slowdown (default: 0.25)
+    
+    Returns
+    -------
+    regressions : list of dict
+        Results slower than the baseline by more than `tolerance`, with the
+        ratio to the baseline time added under 'ratio'
+    """
+    reference = {(r['function'], r['dtype'], r['size']): r['time']
+                 for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r['function'], r['dtype'], r['size'])
+        if key not in reference:
+            continue
+        ratio = r['time'] / reference[key]
+        if ratio > 1 + tolerance:
+            regressions.append(dict(r, ratio=ratio))
+    return regressions
+
+def bench_suite(max_size, output=None, baseline=None, tolerance=0.25):
+    """
+    Run the suite, save the results and report regressions
+    
+    Parameters
+    ----------
+    max_size : int
+        Largest array size to time
+    output : str, optional
+        JSON file to write the results to
+    baseline : str, optional
+        JSON file of earlier results to compare against
+    tolerance : float, optional
+        Largest acceptable relative slowdown (default: 0.25)
+    
+    Returns
+    -------
+    ok : bool
+        False if any result regressed against the baseline
+    """
+    results = run_suite(max_size)
+    if output is not None:
+        meta = {'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'processor': platform.processor()}
+        with open(output, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+    if baseline is None:
+        return True
+    
+    with open(baseline) as f:
+        regressions = compare(results, json.load(f)['results'], tolerance)
+    print(f"Regressions against {baseline} (tolerance {tolerance:.0%}): "
+          f"{len(regressions)}")
+    for r in regressions:
+        print(f"  {r['function']:<16} {r['dtype']:<8} {r['size']:>10} "
+              f"{r['ratio']:.2f}x slower")
+    return not regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('scalar', help="scalar fast path timings")
+    sub.add_parser('accuracy', help="float32 accuracy check")
+    sub.add_parser('import', help="import time of constants")
+    sub.add_parser('jit', help="JIT backend against NumPy")
+    sub.add_parser('pipeline', help="asyncio live-reduction throughput")
+    suite = sub.add_parser('suite', help="all converters over sizes/dtypes")
+    suite.add_argument('--max-size', type=float, default=1e6,
+                       help="largest array size (default: 1e6)")
+    suite.add_argument('--output', help="JSON file to write results to")
+    suite.add_argument('--baseline', help="JSON results to compare against")
+    suite.add_argument('--tolerance', type=float, default=0.25,
+                       help="acceptable relative slowdown (default: 0.25)")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'scalar':
+        bench_scalar_fast_path()
+        return True
+    if args.command == 'accuracy':
+        return check_float32_accuracy()
+    if args.command == 'import':
+        return bench_import()
+    if args.command == 'jit':
+        return bench_jit()
+    if args.command == 'pipeline':
+        return bench_pipeline()
+    if args.command == 'suite':
+        return bench_suite(int(args.max_size), args.output, args.baseline,
+                           args.tolerance)
+    bench_scalar_fast_path()
+    return check_float32_accuracy()
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -1,5 +1,29 @@
-import numpy as np
-from numpy import pi
+import math
+import os
+import sys
+import warnings
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from math import pi
+
+
+class _LazyNumPy:
+    """
+    Stand-in for the numpy module that imports it on first use
+    
+    Importing NumPy takes longer than everything else in this module, and
+    scripts that only need the constants or convert Python scalars never
+    touch it. The first attribute access imports NumPy and replaces this
+    object with the real module.
+    """
+    def __getattr__(self, name):
+        global np
+        import numpy
+        np = numpy
+        return getattr(numpy, name)
+
+np = _LazyNumPy()
 
 # Physical constants
 h = 6.62607015e-34   # Planck constant [Js]
@@ -17,12 +41,186 @@ mn = 1.6749275e-27 # Neutron mass [kg]
 mHe = 4.002602*mu   # Mass of He-4 [kg]
 mHe3 = 3.0160293*mu # Mass of He-3 [kg]
 
+# Atom and molecule beam things (natural isotopic abundance for Ne-Xe)
+mH = 1.00782503223*mu  # Mass of H atom [kg]
+mD = 2.01410177812*mu  # Mass of D atom [kg]
+mH2 = 2*mH             # Mass of H2 molecule [kg]
+mD2 = 2*mD             # Mass of D2 molecule [kg]
+mNe = 20.1797*mu       # Mass of Ne atom [kg]
+mAr = 39.948*mu        # Mass of Ar atom [kg]
+mKr = 83.798*mu        # Mass of Kr atom [kg]
+mXe = 131.293*mu       # Mass of Xe atom [kg]
+
 # Conversion factors
 meV2J = 1.6021892*1E-22  # Convert from meV to J
 
 # Neutron conversion functions
 # Species identification and mass lookup
 
+# Species table. The code of a species is its index in SPECIES and
+# _SPECIES_MASSES; identifiers are normalized (lower case, no spaces or
+# dashes) and looked up in _SPECIES_ALIASES. Use register_species to add to
+# the table rather than modifying it directly.
+SPECIES = []
+_SPECIES_MASSES = array('d')
+_SPECIES_ALIASES = {}
+
+# Identifiers that resolve to a default isotope, with a warning
+_SPECIES_DEFAULTS = {'he': 'He-4', 'helium': 'He-4'}
+
+# Coefficient tables of the mixed-species conversions, indexed by species
+# code and rebuilt when a species is registered
+_species_plans = {}
+
+def _normalize_species(species):
+    return species.lower().replace(' ', '').replace('-', '')
+
+def register_species(name, mass, aliases=()):
+    """
+    Add a particle species to the species table
+    
+    Parameters
+    ----------
+    name : str
+        Canonical name of the species (e.g., 'Ne')
+    mass : float
+        Particle mass [kg]
+    aliases : sequence of str, optional
+        Other identifiers for the species (e.g., ('neon',))
+    
+    Returns
+    -------
+    code : int
+        Species code, see `species_code`
+    """
+    keys = {_normalize_species(a) for a in (name, *aliases)}
+    taken = sorted(k for k in keys
+                   if k in _SPECIES_ALIASES or k in _SPECIES_DEFAULTS)
+    if taken:
+        raise ValueError(f"Species identifiers already in use: {taken}")
+    code = len(SPECIES)
+    SPECIES.append(name)
+    _SPECIES_MASSES.append(mass)
+    for key in keys:
+        _SPECIES_ALIASES[key] = code
+    _species_plans.clear()
+    return code
+
+register_species('n', mn, ['neutron'])
+register_species('He-3', mHe3, ['helium3', '3he', '3helium'])
+register_species('He-4', mHe, ['helium4', '4he', '4helium'])
+register_species('H', mH, ['hydrogen', '1h'])
+register_species('D', mD, ['deuterium', '2h'])
+register_species('H2', mH2, ['dihydrogen'])
+register_species('D2', mD2, ['dideuterium'])
+register_species('Ne', mNe, ['neon'])
+register_species('Ar', mAr, ['argon'])
+register_species('Kr', mKr, ['krypton'])
+register_species('Xe', mXe, ['xenon'])
+
+# Species warnings
+class SpeciesWarning(UserWarning):
+    """
+    Warning about an ambiguous particle species identifier
+    """
+
+_SPECIES_WARNING_ACTIONS = ('once', 'ignore', 'error')
+_species_warning_action = 'once'
+_species_warned = set()
+
+def set_species_warnings(action):
+    """
+    Set how warnings about ambiguous species identifiers are reported
+    
+    Parameters
+    ----------
+    action : str
+        'once' to issue a `SpeciesWarning` the first time each message
+        occurs in the process (default), 'ignore' to silence them, or
+        'error' to raise them as exceptions
+    """
+    global _species_warning_action
+    if action not in _SPECIES_WARNING_ACTIONS:
+        raise ValueError(f"Unknown action: {action}. Use one of "
+                         f"{_SPECIES_WARNING_ACTIONS}")
+    _species_warning_action = action
+    # Cached converters have already resolved their species, drop them so
+    # the new action applies to them
+    _converters.clear()
+
+# Directory of the library, whose frames are skipped so species warnings
+# point at user code
+_LIBRARY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _user_stacklevel():
+    """
+    Stack level of the first caller outside this library
+    """
+    frame = sys._getframe(1)
+    level = 1
+    while (frame.f_back is not None
+           and os.path.dirname(os.path.abspath(frame.f_code.co_filename))
+           == _LIBRARY_DIR):
+        frame = frame.f_back
+        level += 1
+    return level
+
+def _warn_species(message):
+    """
+    Report a species warning according to `set_species_warnings`
+    
+    After the first time, a message costs a set lookup and does no I/O.
+    """
+    if _species_warning_action == 'ignore':
+        return
+    if _species_warning_action == 'error':
+        raise SpeciesWarning(message)
+    if message in _species_warned:
+        return
+    _species_warned.add(message)
+    warnings.warn(message, SpeciesWarning, stacklevel=_user_stacklevel())
+
+
+@lru_cache(maxsize=1024)
+def _resolve_species(species):
+    """
+    Species code of an identifier and the default it fell back to, if any
+    """
+    key = _normalize_species(species)
+    default = _SPECIES_DEFAULTS.get(key)
+    if default is not None:
+        key = _normalize_species(default)
+    try:
+        return _SPECIES_ALIASES[key], default
+    except KeyError:
+        raise ValueError(f"Unknown species: {species}. Use one of "
+                         f"{SPECIES} or register_species()") from None
+
+def species_code(species):
+    """
+    Get the integer code of a particle species
+    
+    Results are cached, so repeated lookups of the same identifier cost a
+    single dictionary lookup. Identifiers without an isotope, such as 'He',
+    resolve to a default isotope with a `SpeciesWarning`, see
+    `set_species_warnings`.
+    
+    Parameters
+    ----------
+    species : str
+        Species identifier (e.g., 'n', 'neutron', 'He-3', 'he4', 'D2', etc.)
+    
+    Returns
+    -------
+    code : int
+        Index of the species in `SPECIES`
+    """
+    code, default = _resolve_species(species)
+    if default is not None:
+        _warn_species(f"'{species}' specified without isotope, "
+                      f"defaulting to {default}")
+    return code
+
 def get_species_mass(species):
     """
     Get the mass of a particle species from a string identifier
@@ -37,31 +235,406 @@ def get_species_mass(species):
     mass : float
         Particle mass [kg]
     """
-    species_lower = species.lower().replace(' ', '').replace('-', '')
+    return _SPECIES_MASSES[species_code(species)]
+
+
+# Scalar fast path
+_SCALAR_TYPES = (float, int)
+
+def _is_scalar(x):
+    return type(x) in _SCALAR_TYPES or isinstance(x, np.generic)
+
+def _empty(x):
+    """
+    Allocate an output buffer shaped like `x` with a floating dtype
+    """
+    x = np.asarray(x)
+    return np.empty(x.shape, np.result_type(x.dtype, 1.0))
+
+
+# Closed-form conversion kernels, y = f(x, a), keyed by the exponent n in
+# y = a*x**n. Array inputs are evaluated with ufuncs writing into a single
+# output buffer, so no temporaries are created beyond `out`; `out` may be
+# `x` itself for an in-place conversion.
+#
+# The coefficients are Python floats, so floating-point inputs keep their
+# dtype (float32 in, float32 out). The squaring kernels take b = sqrt(a) and
+# compute (b*x)**2 or (b/x)**2, which keeps the intermediate close to the
+# result: x*x for a momentum is ~1e-48 and would underflow in float32.
+#
+# The square-root kernels use `math.sqrt` for positive Python scalars;
+# zero, negative values and NumPy scalars go through `np.sqrt`, so that
+# dividing by the root of zero still gives inf.
+def _scale(x, a, out=None):
+    if out is None:
+        if _is_scalar(x):
+            return a * x
+        out = _empty(x)
+    return np.multiply(x, a, out=out)
+
+def _inverse(x, a, out=None):
+    if out is None:
+        if _is_scalar(x):
+            return a / x
+        out = _empty(x)
+    return np.divide(a, x, out=out)
+
+def _square(x, b, out=None):
+    if out is None:
+        if _is_scalar(x):
+            y = b * x
+            return y * y
+        out = _empty(x)
+    np.multiply(x, b, out=out)
+    return np.square(out, out=out)
+
+def _inverse_square(x, b, out=None):
+    if out is None:
+        if _is_scalar(x):
+            y = b / x
+            return y * y
+        out = _empty(x)
+    np.divide(b, x, out=out)
+    return np.square(out, out=out)
+
+def _sqrt_scale(x, a, out=None):
+    if out is None:
+        if type(x) in _SCALAR_TYPES and x > 0:
+            return a * math.sqrt(x)
+        if _is_scalar(x):
+            return a * np.sqrt(x)
+        out = _empty(x)
+    np.sqrt(x, out=out)
+    return np.multiply(out, a, out=out)
+
+def _inverse_sqrt(x, a, out=None):
+    if out is None:
+        if type(x) in _SCALAR_TYPES and x > 0:
+            return a / math.sqrt(x)
+        if _is_scalar(x):
+            return a / np.sqrt(x)
+        out = _empty(x)
+    np.sqrt(x, out=out)
+    return np.divide(a, out, out=out)
+
+_KERNELS = {
+    1.0: _scale,
+    -1.0: _inverse,
+    2.0: _square,
+    -2.0: _inverse_square,
+    0.5: _sqrt_scale,
+    -0.5: _inverse_sqrt,
+}
+
+# Quantities known to the conversion engine: energy [meV], wavelength [m],
+# momentum [kg⋅m/s], wavevector [1/m] and velocity [m/s]
+QUANTITIES = ('E', 'lambda', 'p', 'k', 'v')
+
+
+# Precompiled per-species converters
+class Converter:
+    """
+    Unit conversions for a single particle species
+    
+    The species string is resolved and the conversion coefficients are
+    computed once on construction, so the bound conversion methods do no
+    species lookup when called.
+    
+    Parameters
+    ----------
+    species : str, optional
+        Particle species (default: 'n')
     
-    # Neutron
-    if species_lower in ['n', 'neutron']:
-        return mn
+    Attributes
+    ----------
+    species : str
+        Species identifier the converter was created with
+    m : float
+        Particle mass [kg]
+    """
+    def __init__(self, species='n'):
+        self.species = species
+        self.m = get_species_mass(species)
+        
+        # Fused coefficients
+        self._c_lambda_E = h / math.sqrt(2 * self.m * meV2J) # E = (c/lambda)**2
+        self._c_E_lambda = h / math.sqrt(2 * self.m * meV2J) # lambda = c/sqrt(E)
+        self._c_E_p = math.sqrt(2 * self.m * meV2J)      # p = c*sqrt(E)
+        self._c_p_E = 1 / math.sqrt(2 * self.m * meV2J)  # E = (c*p)**2
+        self._c_v_E = math.sqrt(0.5 * self.m / meV2J)    # E = (c*v)**2
+        self._c_E_v = math.sqrt(2 * meV2J / self.m)      # v = c*sqrt(E)
+        
+        # Every quantity as a power law of energy, q = a*E**n
+        powers = {
+            'E': (1.0, 1.0),
+            'lambda': (self._c_E_lambda, -0.5),
+            'p': (self._c_E_p, 0.5),
+            'k': (self._c_E_p / hbar, 0.5),
+            'v': (self._c_E_v, 0.5),
+        }
+        # Reduce every pair to dst = a*src**n
+        self._coefficients = {}
+        self._plans = {}
+        for src, (a_src, n_src) in powers.items():
+            for dst, (a_dst, n_dst) in powers.items():
+                n = n_dst / n_src
+                # Identity conversions copy the values exactly
+                a = a_dst * a_src**(-n) if src != dst else 1.0
+                self._coefficients[src, dst] = (a, n)
+                if abs(n) == 2:
+                    self._plans[src, dst] = (_KERNELS[n], math.sqrt(a))
+                else:
+                    self._plans[src, dst] = (_KERNELS[n], a)
     
-    # Helium-3
-    elif species_lower in ['he3', 'helium3', '3he', '3helium']:
-        return mHe3
+    def __repr__(self):
+        return f"Converter({self.species!r})"
     
-    # Helium-4
-    elif species_lower in ['he4', 'helium4', '4he', '4helium']:
-        return mHe
+    def coefficients(self, src, dst):
+        """
+        Closed-form coefficients of a conversion
+        
+        Parameters
+        ----------
+        src, dst : str
+            Source and destination quantities, one of `QUANTITIES`
+        
+        Returns
+        -------
+        a : float
+            Prefactor
+        n : float
+            Exponent, such that dst = a*src**n
+        """
+        try:
+            return self._coefficients[src, dst]
+        except KeyError:
+            raise ValueError(f"Unknown conversion: {src} -> {dst}. "
+                             f"Use quantities from {QUANTITIES}") from None
     
-    # Generic helium (defaults to He-4)
-    elif species_lower in ['he', 'helium']:
-        print("Warning: 'He' specified without isotope, defaulting to He-4")
-        return mHe
+    def convert(self, x, src, dst, out=None):
+        """
+        Convert between any pair of quantities in a single pass
+        
+        Parameters
+        ----------
+        x : float or array
+            Values of the source quantity
+        src, dst : str
+            Source and destination quantities, one of `QUANTITIES`
+        out : array, optional
+            Array to write the result into, may be `x` (default: None)
+        
+        Returns
+        -------
+        y : float or array
+            Values of the destination quantity
+        """
+        try:
+            kernel, a = self._plans[src, dst]
+        except KeyError:
+            raise ValueError(f"Unknown conversion: {src} -> {dst}. "
+                             f"Use quantities from {QUANTITIES}") from None
+        return kernel(x, a, out)
     
-    else:
-        raise ValueError(f"Unknown species: {species}. Use 'n', 'He-3', 'He-4'")
+    def lambda_to_E(self, wavelength, out=None):
+        """
+        Convert wavelength [m] to energy [meV]
+        """
+        return _inverse_square(wavelength, self._c_lambda_E, out)
+    
+    def E_to_lambda(self, energy, out=None):
+        """
+        Convert energy [meV] to wavelength [m]
+        """
+        return _inverse_sqrt(energy, self._c_E_lambda, out)
+    
+    def lambda_to_p(self, wavelength, out=None):
+        """
+        Convert wavelength [m] to momentum [kg⋅m/s]
+        """
+        return _inverse(wavelength, h, out)
+    
+    def p_to_lambda(self, momentum, out=None):
+        """
+        Convert momentum [kg⋅m/s] to wavelength [m]
+        """
+        return _inverse(momentum, h, out)
+    
+    def E_to_p(self, energy, out=None):
+        """
+        Convert energy [meV] to momentum [kg⋅m/s]
+        """
+        return _sqrt_scale(energy, self._c_E_p, out)
+    
+    def p_to_E(self, momentum, out=None):
+        """
+        Convert momentum [kg⋅m/s] to energy [meV]
+        """
+        return _square(momentum, self._c_p_E, out)
+    
+    def v_to_E(self, velocity, out=None):
+        """
+        Convert velocity [m/s] to energy [meV]
+        """
+        return _square(velocity, self._c_v_E, out)
+    
+    def E_to_v(self, energy, out=None):
+        """
+        Convert energy [meV] to velocity [m/s]
+        """
+        return _sqrt_scale(energy, self._c_E_v, out)
+
+
+# Mixed-species conversions
+def _species_plan(src, dst):
+    """
+    Kernel and per-species coefficient table of a conversion
+    """
+    try:
+        return _species_plans[src, dst]
+    except KeyError:
+        plans = [converter(name)._plans.get((src, dst)) for name in SPECIES]
+        if plans[0] is None:
+            raise ValueError(f"Unknown conversion: {src} -> {dst}. "
+                             f"Use quantities from {QUANTITIES}") from None
+        plan = (plans[0][0], np.array([a for _, a in plans]))
+        _species_plans[src, dst] = plan
+        return plan
+
+
+class MixedConverter:
+    """
+    Unit conversions for values with per-element particle species
+    
+    The coefficients of a conversion are gathered from a per-species table
+    with a single `np.take`, so arrays mixing species convert in one pass
+    without splitting them by species.
+    
+    Parameters
+    ----------
+    codes : array of int
+        Species code of each element, see `species_code`
+    """
+    def __init__(self, codes):
+        codes = np.asarray(codes)
+        if not np.issubdtype(codes.dtype, np.integer):
+            raise ValueError("species must be a str or an array of integer "
+                             "species codes")
+        if codes.size and (codes.min() < 0 or codes.max() >= len(SPECIES)):
+            raise ValueError(f"Species codes must be in [0, {len(SPECIES)})")
+        self.codes = codes
+    
+    def __repr__(self):
+        return f"MixedConverter(<{self.codes.size} species codes>)"
+    
+    def convert(self, x, src, dst, out=None):
+        """
+        Convert between any pair of quantities in a single pass
+        
+        Parameters
+        ----------
+        x : float or array
+            Values of the source quantity, broadcast against the codes
+        src, dst : str
+            Source and destination quantities, one of `QUANTITIES`
+        out : array, optional
+            Array to write the result into, may be `x` (default: None)
+        
+        Returns
+        -------
+        y : float or array
+            Values of the destination quantity
+        """
+        kernel, table = _species_plan(src, dst)
+        if out is not None:
+            dtype = out.dtype
+        else:
+            dtype = np.result_type(np.asarray(x).dtype, 1.0)
+        a = np.take(table.astype(dtype, copy=False), self.codes)
+        return kernel(x, a, out)
+    
+    def lambda_to_E(self, wavelength, out=None):
+        """
+        Convert wavelength [m] to energy [meV]
+        """
+        return self.convert(wavelength, 'lambda', 'E', out)
+    
+    def E_to_lambda(self, energy, out=None):
+        """
+        Convert energy [meV] to wavelength [m]
+        """
+        return self.convert(energy, 'E', 'lambda', out)
+    
+    def lambda_to_p(self, wavelength, out=None):
+        """
+        Convert wavelength [m] to momentum [kg⋅m/s]
+        """
+        return self.convert(wavelength, 'lambda', 'p', out)
+    
+    def p_to_lambda(self, momentum, out=None):
+        """
+        Convert momentum [kg⋅m/s] to wavelength [m]
+        """
+        return self.convert(momentum, 'p', 'lambda', out)
+    
+    def E_to_p(self, energy, out=None):
+        """
+        Convert energy [meV] to momentum [kg⋅m/s]
+        """
+        return self.convert(energy, 'E', 'p', out)
+    
+    def p_to_E(self, momentum, out=None):
+        """
+        Convert momentum [kg⋅m/s] to energy [meV]
+        """
+        return self.convert(momentum, 'p', 'E', out)
+    
+    def v_to_E(self, velocity, out=None):
+        """
+        Convert velocity [m/s] to energy [meV]
+        """
+        return self.convert(velocity, 'v', 'E', out)
+    
+    def E_to_v(self, energy, out=None):
+        """
+        Convert energy [meV] to velocity [m/s]
+        """
+        return self.convert(energy, 'E', 'v', out)
+
+
+_converters = {}
+
+def converter(species='n'):
+    """
+    Get the converter for a particle species
+    
+    Converters are cached by species identifier, so repeated calls with
+    the same string return the same object. An array of species codes gives
+    a `MixedConverter` for values with per-element species.
+    
+    Parameters
+    ----------
+    species : str or array of int, optional
+        Particle species, or species code of each element (default: 'n')
+    
+    Returns
+    -------
+    conv : Converter or MixedConverter
+        Converter for the species
+    """
+    try:
+        return _converters[species]
+    except KeyError:
+        conv = Converter(species)
+        _converters[species] = conv
+        return conv
+    except TypeError:
+        # Unhashable, i.e. an array of species codes
+        return MixedConverter(species)
 
 
 # Conversion functions
-def lambda_to_E(wavelength, species='n'):
+def lambda_to_E(wavelength, species='n', out=None):
     """
     Convert wavelength to energy
     
@@ -69,19 +642,21 @@ def lambda_to_E(wavelength, species='n'):
     ----------
     wavelength : float or array
         Wavelength [m]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     energy : float or array
         Energy [meV]
     """
-    m = get_species_mass(species)
-    energy = (h**2 / (2 * m * wavelength**2)) / meV2J
-    return energy
+    return converter(species).lambda_to_E(wavelength, out)
 
-def E_to_lambda(energy, species='n'):
+def E_to_lambda(energy, species='n', out=None):
     """
     Convert energy to wavelength
     
@@ -89,19 +664,21 @@ def E_to_lambda(energy, species='n'):
     ----------
     energy : float or array
         Energy [meV]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     wavelength : float or array
         Wavelength [m]
     """
-    m = get_species_mass(species)
-    wavelength = h / np.sqrt(2 * m * energy * meV2J)
-    return wavelength
+    return converter(species).E_to_lambda(energy, out)
 
-def lambda_to_p(wavelength, species='n'):
+def lambda_to_p(wavelength, species='n', out=None):
     """
     Convert wavelength to momentum
     
@@ -109,18 +686,21 @@ def lambda_to_p(wavelength, species='n'):
     ----------
     wavelength : float or array
         Wavelength [m]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     momentum : float or array
         Momentum [kg⋅m/s]
     """
-    momentum = h / wavelength
-    return momentum
+    return converter(species).lambda_to_p(wavelength, out)
 
-def p_to_lambda(momentum, species='n'):
+def p_to_lambda(momentum, species='n', out=None):
     """
     Convert momentum to wavelength
     
@@ -128,18 +708,21 @@ def p_to_lambda(momentum, species='n'):
     ----------
     momentum : float or array
         Momentum [kg⋅m/s]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     wavelength : float or array
         Wavelength [m]
     """
-    wavelength = h / momentum
-    return wavelength
+    return converter(species).p_to_lambda(momentum, out)
 
-def E_to_p(energy, species='n'):
+def E_to_p(energy, species='n', out=None):
     """
     Convert energy to momentum
     
@@ -147,19 +730,21 @@ def E_to_p(energy, species='n'):
     ----------
     energy : float or array
         Energy [meV]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     momentum : float or array
         Momentum [kg⋅m/s]
     """
-    m = get_species_mass(species)
-    momentum = np.sqrt(2 * m * energy * meV2J)
-    return momentum
+    return converter(species).E_to_p(energy, out)
 
-def p_to_E(momentum, species='n'):
+def p_to_E(momentum, species='n', out=None):
     """
     Convert momentum to energy
     
@@ -167,19 +752,21 @@ def p_to_E(momentum, species='n'):
     ----------
     momentum : float or array
         Momentum [kg⋅m/s]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     energy : float or array
         Energy [meV]
     """
-    m = get_species_mass(species)
-    energy = (momentum**2 / (2 * m)) / meV2J
-    return energy
+    return converter(species).p_to_E(momentum, out)
 
-def v_to_E(velocity, species='n'):
+def v_to_E(velocity, species='n', out=None):
     """
     Convert velocity to energy
     
@@ -187,19 +774,21 @@ def v_to_E(velocity, species='n'):
     ----------
     velocity : float or array
         Velocity [m/s]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     energy : float or array
         Energy [meV]
     """
-    m = get_species_mass(species)
-    energy = (0.5 * m * velocity**2) / meV2J
-    return energy
+    return converter(species).v_to_E(velocity, out)
 
-def E_to_v(energy, species='n'):
+def E_to_v(energy, species='n', out=None):
     """
     Convert energy to velocity
     
@@ -207,14 +796,200 @@ def E_to_v(energy, species='n'):
     ----------
     energy : float or array
         Energy [meV]
-    species : str, optional
-        Particle species (default: 'n')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert
+        in place (default: None)
     
     Returns
     -------
     velocity : float or array
         Velocity [m/s]
     """
-    m = get_species_mass(species)
-    velocity = np.sqrt(2 * energy * meV2J / m)
-    return velocity
+    return converter(species).E_to_v(energy, out)
+
+
+def convert(x, src, dst, species='n', out=None):
+    """
+    Convert between any pair of quantities
+    
+    The conversion is reduced to a single closed-form expression, either
+    a*x**n or a/sqrt(x), so chains such as `lambda_to_p(E_to_lambda(E))`
+    can be done in one pass without an intermediate array.
+    
+    Parameters
+    ----------
+    x : float or array
+        Values of the source quantity
+    src : str
+        Source quantity: 'E' [meV], 'lambda' [m], 'p' [kg⋅m/s], 'k' [1/m]
+        or 'v' [m/s]
+    dst : str
+        Destination quantity, as for `src`
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : array, optional
+        Array to write the result into. Pass the input array to convert in
+        place (default: None)
+    
+    Returns
+    -------
+    y : float or array
+        Values of the destination quantity
+    """
+    return converter(species).convert(x, src, dst, out)
+
+
+# All quantities at once
+Quantities = namedtuple('Quantities', ['E', 'wavelength', 'p', 'k', 'v'])
+Quantities.__doc__ = """
+Energy [meV], wavelength [m], momentum [kg⋅m/s], wavevector [1/m] and
+velocity [m/s] of the same particles
+"""
+
+def all_quantities(x, src='E', species='n', out=None):
+    """
+    Compute energy, wavelength, momentum, wavevector and velocity together
+    
+    The square root of the energy is taken once, giving the velocity, and
+    every other quantity is a single multiplication or division of it.
+    
+    Parameters
+    ----------
+    x : float or array
+        Values of the source quantity
+    src : str, optional
+        Source quantity, see `convert` (default: 'E')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    out : Quantities or sequence of arrays, optional
+        Arrays to write E, wavelength, p, k and v into; any may be None
+        to allocate a new array (default: None)
+    
+    Returns
+    -------
+    quantities : Quantities
+        Named tuple of E, wavelength, p, k and v
+    """
+    conv = converter(species)
+    if out is None:
+        out = Quantities(None, None, None, None, None)
+    else:
+        out = Quantities(*out)
+    
+    v = conv.convert(x, src, 'v', out.v)
+    values = []
+    for dst, buffer in zip(('E', 'lambda', 'p', 'k'), out):
+        if dst == src:
+            values.append(conv.convert(x, src, dst, buffer))
+        else:
+            values.append(conv.convert(v, 'v', dst, buffer))
+    return Quantities(*values, v)
+
+
+# Lazy quantities
+class Quantity:
+    """
+    Values of a quantity with conversions recorded lazily
+    
+    `to` records a conversion without evaluating it. Every quantity is a
+    power law of energy, so a chain such as
+    `Quantity(E).to('lambda').to('k').to('v')` folds to the single closed-form
+    conversion from the first quantity to the last, evaluated in one pass by
+    `compute`.
+    
+    Parameters
+    ----------
+    values : float or array
+        Values of the quantity
+    kind : str, optional
+        Quantity of `values`, one of `QUANTITIES` (default: 'E')
+    species : str or array of int, optional
+        Particle species, or species code of each element, see
+        `species_code` (default: 'n')
+    
+    Attributes
+    ----------
+    kind : str
+        Quantity after the recorded conversions
+    path : tuple of str
+        Quantities the values pass through, starting with the stored one
+    """
+    def __init__(self, values, kind='E', species='n'):
+        if kind not in QUANTITIES:
+            raise ValueError(f"Unknown quantity: {kind}. "
+                             f"Use one of {QUANTITIES}")
+        self.values = values
+        self.species = species
+        self.path = (kind,)
+    
+    @property
+    def kind(self):
+        return self.path[-1]
+    
+    def __repr__(self):
+        return (f"Quantity({' -> '.join(self.path)}, "
+                f"species={self.species!r})")
+    
+    def to(self, dst):
+        """
+        Record a conversion to another quantity
+        
+        Parameters
+        ----------
+        dst : str
+            Destination quantity, one of `QUANTITIES`
+        
+        Returns
+        -------
+        quantity : Quantity
+            New lazy quantity sharing the same values
+        """
+        if dst not in QUANTITIES:
+            raise ValueError(f"Unknown quantity: {dst}. "
+                             f"Use one of {QUANTITIES}")
+        quantity = Quantity.__new__(Quantity)
+        quantity.values = self.values
+        quantity.species = self.species
+        quantity.path = self.path + (dst,)
+        return quantity
+    
+    def coefficients(self):
+        """
+        Folded coefficients of the recorded conversions
+        
+        Only available for a single species.
+        
+        Returns
+        -------
+        a : float
+            Prefactor
+        n : float
+            Exponent, such that the result is a*values**n
+        """
+        if not isinstance(self.species, str):
+            raise ValueError("Coefficients need a single species")
+        return converter(self.species).coefficients(self.path[0],
+                                                    self.path[-1])
+    
+    def compute(self, out=None):
+        """
+        Evaluate the recorded conversions as one fused kernel
+        
+        Parameters
+        ----------
+        out : array, optional
+            Array to write the result into, may be the stored values
+            (default: None)
+        
+        Returns
+        -------
+        y : float or array
+            Values of the final quantity
+        """
+        return converter(self.species).convert(self.values, self.path[0],
+                                               self.path[-1], out)
@@ -0,0 +1,215 @@
+"""
+Tools for neutron and atom event data stored as flat binary files
+"""
+import os
+
+import numpy as np
+
+from constants import converter
+from tof import tof_to_v
+
+
+def convert_file(path_in, path_out, src='lambda', dst='E', species='n',
+                 dtype=np.float64, chunk=2**20):
+    """
+    Convert a flat binary file of values from one quantity to another
+    
+    The input and output are memory-mapped one chunk at a time and each
+    chunk is unmapped once converted, so resident memory stays bounded by
+    the chunk size however large the file is.
+    
+    Parameters
+    ----------
+    path_in : str
+        Input file of raw `dtype` values
+    path_out : str
+        Output file, created or overwritten, same dtype as the input. If it
+        is the input file, the values are converted in place
+    src, dst : str, optional
+        Source and destination quantities, see `constants.convert`
+        (default: 'lambda' -> 'E')
+    species : str, optional
+        Particle species (default: 'n')
+    dtype : data-type, optional
+        Data type of the values in the file (default: np.float64)
+    chunk : int, optional
+        Number of values converted at a time (default: 2**20)
+    
+    Returns
+    -------
+    n : int
+        Number of values converted
+    """
+    conv = converter(species)
+    dtype = np.dtype(dtype)
+    size = os.path.getsize(path_in)
+    if size % dtype.itemsize:
+        raise ValueError(f"Size of {path_in} ({size} bytes) is not a multiple "
+                         f"of the {dtype} item size")
+    n = size // dtype.itemsize
+    
+    in_place = os.path.exists(path_out) and os.path.samefile(path_in,
+                                                               path_out)
+    if not in_place:
+        # Allocate the output file up front so it can be mapped in chunks
+        with open(path_out, 'wb') as f:
+            f.truncate(size)
+    
+    for start in range(0, n, chunk):
+        count = min(chunk, n - start)
+        offset = start * dtype.itemsize
+        y = np.memmap(path_out, dtype=dtype, mode='r+', offset=offset,
+                      shape=(count,))
+        if in_place:
+            x = y
+        else:
+            x = np.memmap(path_in, dtype=dtype, mode='r', offset=offset,
+                          shape=(count,))
+        conv.convert(x, src, dst, out=y)
+        y.flush()
+        del x, y
+    return n
+
+
+class UniformHistogram:
+    """
+    Histogram with uniform bins filled incrementally
+    
+    Values are binned with index arithmetic and `np.bincount` on blocks
+    small enough to stay in cache, using buffers that are reused between
+    calls. This needs no sorting or searching and is a few times faster than
+    `np.histogram`. Bins are half-open, [lo, hi) overall.
+    
+    Parameters
+    ----------
+    lo, hi : float
+        Lower and upper edge of the binned range
+    n_bins : int
+        Number of bins
+    
+    Attributes
+    ----------
+    edges : array, shape (n_bins + 1,)
+        Bin edges
+    """
+    BLOCK = 2**16  # Values binned at a time
+    
+    def __init__(self, lo, hi, n_bins):
+        if not hi > lo or n_bins < 1:
+            raise ValueError("Need hi > lo and at least one bin")
+        self.lo = lo
+        self.hi = hi
+        self.n_bins = n_bins
+        self.edges = np.linspace(lo, hi, n_bins + 1)
+        
+        # Bin i of the histogram is index i + 1, with under- and overflow
+        # (and NaN) counted at the ends
+        self._scale = n_bins / (hi - lo)
+        self._offset = 1 - lo * self._scale
+        self._counts = np.zeros(n_bins + 2, dtype=np.int64)
+        self._x = np.empty(self.BLOCK)
+        self._index = np.empty(self.BLOCK, dtype=np.intp)
+    
+    @property
+    def counts(self):
+        """
+        Counts in each bin, array of int with shape (n_bins,)
+        """
+        return self._counts[1:-1]
+    
+    @property
+    def n_outside(self):
+        """
+        Number of values outside the binned range, including NaN
+        """
+        return int(self._counts[0] + self._counts[-1])
+    
+    def add(self, values):
+        """
+        Add values to the histogram
+        
+        Parameters
+        ----------
+        values : array
+            Values to bin
+        """
+        values = np.asarray(values).reshape(-1)
+        for start in range(0, values.size, self.BLOCK):
+            v = values[start:start + self.BLOCK]
+            x = self._x[:v.size]
+            index = self._index[:v.size]
+            np.multiply(v, self._scale, out=x)
+            np.add(x, self._offset, out=x)
+            # fmax/fmin send NaN to the underflow bin
+            np.fmax(x, 0, out=x)
+            np.fmin(x, self.n_bins + 1, out=x)
+            np.copyto(index, x, casting='unsafe')
+            self._counts += np.bincount(index, minlength=self.n_bins + 2)
+
+
+def _chunks(events, chunk):
+    """
+    Iterate over chunks of an array, or over the items of an iterator
+    """
+    if isinstance(events, np.ndarray):
+        events = events.reshape(-1)
+        for start in range(0, events.size, chunk):
+            yield events[start:start + chunk]
+    else:
+        yield from events
+
+def histogram_events(events, lo, hi, n_bins, src='tof', dst='lambda',
+                     species='n', L=None, t0=0.0, chunk=2**16):
+    """
+    Convert and histogram events in chunks with bounded memory
+    
+    Each chunk is converted into a reused buffer and binned into a uniform
+    histogram, so memory use does not grow with the number of events.
+    Conversion and binning are done in cache-sized chunks by default.
+    
+    Parameters
+    ----------
+    events : array or iterable of arrays
+        Event values of the source quantity: an array or memmap, read in
+        chunks of `chunk` events, or an iterator yielding chunks
+    lo, hi : float
+        Range of the histogram in the destination quantity
+    n_bins : int
+        Number of uniform bins
+    src : str, optional
+        Source quantity, 'tof' [s] or one of `constants.QUANTITIES`
+        (default: 'tof')
+    dst : str, optional
+        Destination quantity, one of `constants.QUANTITIES`
+        (default: 'lambda')
+    species : str, optional
+        Particle species (default: 'n')
+    L : float, optional
+        Flight path length [m], required if `src` is 'tof'
+    t0 : float, optional
+        Time-of-flight offset [s] (default: 0)
+    chunk : int, optional
+        Number of events read at a time from an array (default: 2**16)
+    
+    Returns
+    -------
+    hist : UniformHistogram
+        Histogram with `edges`, `counts` and `n_outside`
+    """
+    if src == 'tof' and L is None:
+        raise ValueError("The flight path L is required for 'tof' events")
+    conv = converter(species)
+    hist = UniformHistogram(lo, hi, n_bins)
+    buffer = np.empty(0)
+    for values in _chunks(events, chunk):
+        values = np.asarray(values).reshape(-1)
+        if buffer.size < values.size:
+            buffer = np.empty(values.size)
+        out = buffer[:values.size]
+        if src == 'tof':
+            tof_to_v(values, L, t0, out)
+            conv.convert(out, 'v', dst, out)
+        else:
+            conv.convert(values, src, dst, out)
+        hist.add(out)
+    return hist
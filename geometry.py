@@ -0,0 +1,194 @@
+"""
+Per-pixel instrument geometry, cached on disk
+
+Coordinates follow the usual convention with the beam along +z, y up and
+x completing a right-handed frame; 2θ is measured from the beam and φ around
+it from the +x axis.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+class InstrumentGeometry:
+    """
+    Flight paths, angles and solid angles of detector pixels
+    
+    Parameters
+    ----------
+    L2 : array
+        Sample to pixel distance [m]
+    two_theta : array
+        Scattering angle [rad]
+    phi : array
+        Azimuthal angle around the beam [rad]
+    solid_angle : array
+        Solid angle subtended by the pixel [sr]
+    key : str, optional
+        Content hash of the inputs the geometry was derived from
+    """
+    ARRAYS = ('L2', 'two_theta', 'phi', 'solid_angle')
+    
+    def __init__(self, L2, two_theta, phi, solid_angle, key=None):
+        self.L2 = L2
+        self.two_theta = two_theta
+        self.phi = phi
+        self.solid_angle = solid_angle
+        self.key = key
+    
+    def __repr__(self):
+        return (f"InstrumentGeometry(<{np.size(self.L2)} pixels>, "
+                f"key={self.key!r})")
+    
+    @staticmethod
+    def hash_positions(positions, sample=(0.0, 0.0, 0.0), pixel_area=None,
+                       normals=None):
+        """
+        Content hash of the inputs of `from_positions`
+        
+        Returns
+        -------
+        key : str
+            Hex digest identifying the geometry
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        for a in (positions, sample, pixel_area, normals):
+            if a is None:
+                digest.update(b'None')
+            else:
+                a = np.ascontiguousarray(a, dtype=np.float64)
+                digest.update(repr(a.shape).encode())
+                digest.update(a.tobytes())
+        return digest.hexdigest()
+    
+    @classmethod
+    def from_positions(cls, positions, sample=(0.0, 0.0, 0.0),
+                       pixel_area=None, normals=None, cache_dir=None):
+        """
+        Derive the geometry from pixel positions
+        
+        With `cache_dir`, the geometry is stored under the content hash of
+        the inputs, and later calls with the same inputs load it as
+        memory-mapped arrays instead of recomputing it.
+        
+        Parameters
+        ----------
+        positions : array, shape (n_pixels, 3)
+            Pixel centres [m]
+        sample : array, shape (3,), optional
+            Sample position [m] (default: origin)
+        pixel_area : float or array, optional
+            Area of each pixel [m²]; if not given the solid angles are NaN
+        normals : array, shape (n_pixels, 3), optional
+            Unit normals of the pixel faces; if not given the pixels are
+            taken to face the sample
+        cache_dir : str, optional
+            Directory of cached geometries (default: no caching)
+        
+        Returns
+        -------
+        geometry : InstrumentGeometry
+            Geometry of the pixels
+        """
+        key = cls.hash_positions(positions, sample, pixel_area, normals)
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, key)
+            if os.path.isdir(path):
+                return cls.load(path)
+        
+        r = np.asarray(positions, dtype=np.float64) - np.asarray(sample)
+        L2 = np.linalg.norm(r, axis=-1)
+        two_theta = np.arccos(np.clip(r[..., 2] / L2, -1, 1))
+        phi = np.arctan2(r[..., 1], r[..., 0])
+        if pixel_area is None:
+            solid_angle = np.full(L2.shape, np.nan)
+        else:
+            solid_angle = pixel_area / L2**2
+            if normals is not None:
+                cos_incidence = np.abs(np.sum(r * normals, axis=-1)) / L2
+                solid_angle = solid_angle * cos_incidence
+        geometry = cls(L2, two_theta, phi, solid_angle, key)
+        
+        if cache_dir is not None:
+            geometry._save_cached(path)
+        return geometry
+    
+    def save(self, path):
+        """
+        Save the arrays as .npy files in a directory
+        
+        The directory is written under a temporary name and renamed into
+        place, so concurrent jobs never see a partial geometry. An existing
+        directory at `path` is replaced.
+        
+        Parameters
+        ----------
+        path : str
+            Directory to create
+        """
+        tmp = self._write_tmp(path)
+        old = None
+        try:
+            if os.path.isdir(path):
+                old = tmp + '.old'
+                os.rename(path, old)
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+    
+    def _save_cached(self, path):
+        """
+        Save to the cache, keeping a copy another job wrote first
+        """
+        tmp = self._write_tmp(path)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+    
+    def _write_tmp(self, path):
+        """
+        Write the arrays to a temporary directory next to `path`
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent)
+        try:
+            for name in self.ARRAYS:
+                np.save(os.path.join(tmp, name + '.npy'), getattr(self, name))
+            # mkdtemp uses 0700; caches are shared between users
+            os.chmod(tmp, 0o755)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return tmp
+    
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a geometry saved with `save`
+        
+        Parameters
+        ----------
+        path : str
+            Directory of the geometry
+        mmap_mode : str, optional
+            Memory-map mode passed to `np.load`, None to read the arrays
+            into memory (default: 'r')
+        
+        Returns
+        -------
+        geometry : InstrumentGeometry
+            Geometry with the key taken from the directory name
+        """
+        arrays = [np.load(os.path.join(path, name + '.npy'),
+                          mmap_mode=mmap_mode) for name in cls.ARRAYS]
+        return cls(*arrays, key=os.path.basename(os.path.normpath(path)))
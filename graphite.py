@@ -0,0 +1,140 @@
+"""
+Graphite (002) Bragg monochromators and analysers
+
+Angles are Bragg angles θ (half the scattering angle) in radians. All
+functions are vectorized over the angle or wavelength and the order n.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from constants import converter, d002
+
+
+def bragg_lambda(theta, n=1, d=d002):
+    """
+    Wavelength selected at a Bragg angle, λ = 2 d sinθ / n
+    
+    Parameters
+    ----------
+    theta : float or array
+        Bragg angle [rad]
+    n : int or array, optional
+        Reflection order (default: 1)
+    d : float, optional
+        Lattice spacing [m] (default: graphite 002)
+    
+    Returns
+    -------
+    wavelength : float or array
+        Wavelength [m]
+    """
+    return 2 * d * np.sin(theta) / n
+
+def bragg_E(theta, n=1, d=d002, species='n'):
+    """
+    Energy selected at a Bragg angle
+    
+    Parameters
+    ----------
+    theta : float or array
+        Bragg angle [rad]
+    n : int or array, optional
+        Reflection order (default: 1)
+    d : float, optional
+        Lattice spacing [m] (default: graphite 002)
+    species : str, optional
+        Particle species (default: 'n')
+    
+    Returns
+    -------
+    energy : float or array
+        Energy [meV]
+    """
+    wavelength = bragg_lambda(theta, n, d)
+    return converter(species).lambda_to_E(wavelength)
+
+def lambda_to_bragg(wavelength, n=1, d=d002):
+    """
+    Bragg angle selecting a wavelength, θ = arcsin(n λ / 2 d)
+    
+    Parameters
+    ----------
+    wavelength : float or array
+        Wavelength [m]
+    n : int or array, optional
+        Reflection order (default: 1)
+    d : float, optional
+        Lattice spacing [m] (default: graphite 002)
+    
+    Returns
+    -------
+    theta : float or array
+        Bragg angle [rad], NaN where the wavelength cannot be reflected
+    """
+    with np.errstate(invalid='ignore'):
+        return np.arcsin(n * np.asarray(wavelength) / (2 * d))
+
+def E_to_bragg(energy, n=1, d=d002, species='n'):
+    """
+    Bragg angle selecting an energy
+    
+    Parameters
+    ----------
+    energy : float or array
+        Energy [meV]
+    n : int or array, optional
+        Reflection order (default: 1)
+    d : float, optional
+        Lattice spacing [m] (default: graphite 002)
+    species : str, optional
+        Particle species (default: 'n')
+    
+    Returns
+    -------
+    theta : float or array
+        Bragg angle [rad], NaN where the energy cannot be reflected
+    """
+    return lambda_to_bragg(converter(species).E_to_lambda(energy), n, d)
+
+
+@lru_cache(maxsize=32)
+def harmonic_table(theta_min, theta_max, n_points, max_order=4, d=d002,
+                   species='n'):
+    """
+    Wavelengths and energies of all reflection orders over an angle grid
+    
+    The order n reflection at the same angle passes λ/n and n² E, which
+    contaminates the first-order beam. Tables are cached by their
+    arguments, so repeated scan planning on the same grid is free; the
+    returned arrays are read-only.
+    
+    Parameters
+    ----------
+    theta_min, theta_max : float
+        Range of Bragg angles [rad]
+    n_points : int
+        Number of angles in the grid
+    max_order : int, optional
+        Highest reflection order (default: 4)
+    d : float, optional
+        Lattice spacing [m] (default: graphite 002)
+    species : str, optional
+        Particle species (default: 'n')
+    
+    Returns
+    -------
+    theta : array, shape (n_points,)
+        Bragg angles [rad]
+    wavelength : array, shape (max_order, n_points)
+        Wavelength of order n = 1..max_order in row n - 1 [m]
+    energy : array, shape (max_order, n_points)
+        Energy of order n = 1..max_order in row n - 1 [meV]
+    """
+    theta = np.linspace(theta_min, theta_max, n_points)
+    orders = np.arange(1, max_order + 1)[:, None]
+    wavelength = bragg_lambda(theta, orders, d)
+    energy = converter(species).lambda_to_E(wavelength)
+    for a in (theta, wavelength, energy):
+        a.flags.writeable = False
+    return theta, wavelength, energy
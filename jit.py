@@ -0,0 +1,151 @@
+"""
+Optional JIT-compiled backend for the conversions and kinematics
+
+When numba is installed the closed-form conversions and the
+direct-geometry (Q, ħω) calculation are compiled to single-loop parallel
+kernels, so each output element is computed in one pass over memory. Without
+numba every function falls back to the NumPy implementation with the same
+signature. `AVAILABLE` tells which backend is in use.
+"""
+import math
+
+import numpy as np
+
+import constants
+from constants import converter, hbar
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+AVAILABLE = numba is not None
+
+
+if AVAILABLE:
+    @numba.njit(parallel=True, cache=True)
+    def _convert_kernel(x, a, n, out):
+        # Same closed forms as the NumPy kernels in constants, with b =
+        # sqrt(a) for the squaring conversions
+        if n == 1.0:
+            for i in numba.prange(x.size):
+                out[i] = a * x[i]
+        elif n == -1.0:
+            for i in numba.prange(x.size):
+                out[i] = a / x[i]
+        elif n == 2.0:
+            for i in numba.prange(x.size):
+                y = a * x[i]
+                out[i] = y * y
+        elif n == -2.0:
+            for i in numba.prange(x.size):
+                y = a / x[i]
+                out[i] = y * y
+        elif n == 0.5:
+            for i in numba.prange(x.size):
+                out[i] = a * math.sqrt(x[i])
+        else:
+            for i in numba.prange(x.size):
+                out[i] = a / math.sqrt(x[i])
+    
+    @numba.njit(parallel=True, cache=True)
+    def _direct_Q_omega_kernel(tof, pixel, L2, cos_two_theta, t_offset,
+                               v_to_k, k_to_E, Ei, ki, Q, hw):
+        for i in numba.prange(tof.size):
+            j = pixel[i]
+            kf = v_to_k * L2[j] / (tof[i] - t_offset)
+            y = k_to_E * kf
+            hw[i] = Ei - y * y
+            Q2 = ki * ki + kf * kf - 2 * ki * kf * cos_two_theta[j]
+            Q[i] = math.sqrt(max(Q2, 0.0))
+
+
+def convert(x, src, dst, species='n', out=None):
+    """
+    Convert between any pair of quantities with the JIT backend
+    
+    Falls back to `constants.convert` without numba, for scalars, and for
+    per-element species codes.
+    
+    Parameters
+    ----------
+    x : float or array
+        Values of the source quantity
+    src, dst : str
+        Source and destination quantities, see `constants.convert`
+    species : str or array of int, optional
+        Particle species, or species code of each element (default: 'n')
+    out : array, optional
+        Array to write the result into, may be `x` (default: None)
+    
+    Returns
+    -------
+    y : float or array
+        Values of the destination quantity
+    """
+    if not AVAILABLE or not isinstance(species, str) or np.ndim(x) == 0:
+        return constants.convert(x, src, dst, species, out)
+    
+    a, n = converter(species).coefficients(src, dst)
+    if abs(n) == 2:
+        a = math.sqrt(a)
+    x = np.ascontiguousarray(x)
+    if out is None:
+        out = np.empty(x.shape, np.result_type(x.dtype, 1.0))
+    elif out.shape != x.shape or not out.flags.c_contiguous:
+        # The kernel does no bounds checking, so anything but an output
+        # matching the input goes through NumPy
+        return constants.convert(x, src, dst, species, out)
+    _convert_kernel(x.reshape(-1), a, n, out.reshape(-1))
+    return out
+
+def direct_Q_omega(geometry, Ei, tof, pixel):
+    """
+    Momentum and energy transfer for each event with the JIT backend
+    
+    Equivalent to `geometry.Q_omega(Ei, tof, pixel)`, which is used without
+    numba.
+    
+    Parameters
+    ----------
+    geometry : kinematics.DirectGeometry
+        Spectrometer geometry
+    Ei : float
+        Incident energy [meV]
+    tof : array
+        Time of flight from the moderator [s]
+    pixel : array of int
+        Pixel index of each event
+    
+    Returns
+    -------
+    Q : array
+        Momentum transfer [1/m]
+    hw : array
+        Energy transfer, Ei - Ef [meV]
+    """
+    if not AVAILABLE:
+        return geometry.Q_omega(Ei, tof, pixel)
+    
+    conv = converter(geometry.species)
+    shape = np.shape(tof)
+    vi = conv.convert(Ei, 'E', 'v')
+    ki = conv.convert(Ei, 'E', 'k')
+    k_to_E = math.sqrt(conv.coefficients('k', 'E')[0])
+    tof = np.ascontiguousarray(tof, dtype=np.float64).reshape(-1)
+    pixel = np.ascontiguousarray(pixel).reshape(-1)
+    L2 = np.ascontiguousarray(geometry.L2).reshape(-1)
+    cos_two_theta = np.ascontiguousarray(geometry.cos_two_theta).reshape(-1)
+    
+    # The kernel does no bounds checking
+    if pixel.size != tof.size:
+        raise ValueError(f"Got {tof.size} times of flight but {pixel.size} "
+                         f"pixel indices")
+    if pixel.size and (pixel.min() < 0 or pixel.max() >= L2.size):
+        raise IndexError(f"Pixel indices must be in [0, {L2.size})")
+    Q = np.empty(tof.shape)
+    hw = np.empty(tof.shape)
+    _direct_Q_omega_kernel(tof, pixel, L2, cos_two_theta,
+                           geometry.t0 + geometry.L1 / vi, conv.m / hbar,
+                           k_to_E, Ei, ki, Q, hw)
+    return Q.reshape(shape), hw.reshape(shape)
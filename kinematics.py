@@ -0,0 +1,190 @@
+"""
+Momentum and energy transfer for time-of-flight spectrometers
+
+Q = |k_i - k_f| [1/m] and ħω = E_i - E_f [meV] are computed for every event
+from the measured time of flight and the pixel the event landed in. The
+per-pixel terms (flight paths, cos 2θ) are computed once when the geometry
+object is created and reused for every run with the same geometry.
+"""
+import numpy as np
+
+from constants import converter, hbar
+
+
+class _Geometry:
+    """
+    Shared per-pixel geometry of a spectrometer
+    
+    Parameters
+    ----------
+    L1 : float
+        Moderator to sample distance [m]
+    L2 : float or array
+        Sample to detector distance for each pixel [m]
+    two_theta : float or array
+        Scattering angle for each pixel [rad]
+    t0 : float, optional
+        Time offset subtracted from the time of flight [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    """
+    def __init__(self, L1, L2, two_theta, t0=0.0, species='n'):
+        self.L1 = L1
+        self.L2, self.two_theta = np.broadcast_arrays(
+            np.asarray(L2, dtype=float), np.asarray(two_theta, dtype=float))
+        self.t0 = t0
+        self.species = species
+        self._conv = converter(species)
+        self._v_to_k = self._conv.m / hbar
+        
+        # Cached per-pixel terms
+        self.cos_two_theta = np.cos(self.two_theta)
+    
+    def _pixel_terms(self, pixel):
+        """
+        Per-event L2 and cos 2θ, gathered by pixel index if given
+        """
+        if pixel is None:
+            return self.L2, self.cos_two_theta
+        return np.take(self.L2, pixel), np.take(self.cos_two_theta, pixel)
+    
+    def _Q(self, k_fixed, k_event, cos_two_theta, out):
+        """
+        Q = sqrt(k_fixed**2 + k_event**2 - 2*k_fixed*k_event*cos 2θ)
+        
+        `k_fixed` is the wavevector set by the instrument (scalar or per
+        event), `k_event` the per-event array, which is overwritten.
+        """
+        np.multiply(cos_two_theta, k_event, out=out)
+        np.multiply(out, -2 * k_fixed, out=out)
+        np.square(k_event, out=k_event)
+        np.add(out, k_event, out=out)
+        np.add(out, np.square(k_fixed), out=out)
+        # Rounding can leave tiny negative values for forward scattering
+        np.maximum(out, 0, out=out)
+        return np.sqrt(out, out=out)
+
+
+class DirectGeometry(_Geometry):
+    """
+    Direct-geometry spectrometer: fixed incident energy, final energy from
+    the time of flight
+    
+    Parameters
+    ----------
+    L1 : float
+        Moderator to sample distance [m]
+    L2 : float or array
+        Sample to detector distance for each pixel [m]
+    two_theta : float or array
+        Scattering angle for each pixel [rad]
+    t0 : float, optional
+        Time offset subtracted from the time of flight [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    """
+    def Q_omega(self, Ei, tof, pixel=None):
+        """
+        Momentum and energy transfer for each event
+        
+        Parameters
+        ----------
+        Ei : float
+            Incident energy [meV]
+        tof : array
+            Time of flight from the moderator [s]
+        pixel : array of int, optional
+            Pixel index of each event. If not given, the per-pixel
+            geometry is broadcast against `tof` (default: None)
+        
+        Returns
+        -------
+        Q : array
+            Momentum transfer [1/m]
+        hw : array
+            Energy transfer, Ei - Ef [meV]
+        """
+        L2, cos_two_theta = self._pixel_terms(pixel)
+        vi = self._conv.convert(Ei, 'E', 'v')
+        ki = self._conv.convert(Ei, 'E', 'k')
+        
+        # Time spent on the secondary flight path, then kf = m*L2/(hbar*t)
+        shape = np.broadcast_shapes(np.shape(tof), L2.shape)
+        kf = np.empty(shape)
+        hw = np.empty(shape)
+        np.subtract(tof, self.t0 + self.L1 / vi, out=hw)
+        np.divide(L2, hw, out=kf)
+        np.multiply(kf, self._v_to_k, out=kf)
+        
+        self._conv.convert(kf, 'k', 'E', out=hw)
+        np.subtract(Ei, hw, out=hw)
+        Q = self._Q(ki, kf, cos_two_theta, np.empty(shape))
+        return Q, hw
+
+
+class IndirectGeometry(_Geometry):
+    """
+    Indirect-geometry spectrometer: fixed final energy selected by the
+    analysers, incident energy from the time of flight
+    
+    Parameters
+    ----------
+    L1 : float
+        Moderator to sample distance [m]
+    L2 : float or array
+        Sample to detector distance for each pixel [m]
+    two_theta : float or array
+        Scattering angle for each pixel [rad]
+    Ef : float or array
+        Final energy for each pixel [meV]
+    t0 : float, optional
+        Time offset subtracted from the time of flight [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    """
+    def __init__(self, L1, L2, two_theta, Ef, t0=0.0, species='n'):
+        super().__init__(L1, L2, two_theta, t0, species)
+        self.Ef = np.broadcast_to(np.asarray(Ef, dtype=float), self.L2.shape)
+        
+        # Cached per-pixel terms
+        self.kf = self._conv.convert(self.Ef, 'E', 'k')
+        self.t2 = self.L2 / self._conv.convert(self.Ef, 'E', 'v')
+    
+    def Q_omega(self, tof, pixel=None):
+        """
+        Momentum and energy transfer for each event
+        
+        Parameters
+        ----------
+        tof : array
+            Time of flight from the moderator [s]
+        pixel : array of int, optional
+            Pixel index of each event. If not given, the per-pixel
+            geometry is broadcast against `tof` (default: None)
+        
+        Returns
+        -------
+        Q : array
+            Momentum transfer [1/m]
+        hw : array
+            Energy transfer, Ei - Ef [meV]
+        """
+        if pixel is None:
+            cos_two_theta, kf, t2, Ef = (self.cos_two_theta, self.kf,
+                                         self.t2, self.Ef)
+        else:
+            cos_two_theta, kf, t2, Ef = (np.take(a, pixel) for a in
+                (self.cos_two_theta, self.kf, self.t2, self.Ef))
+        
+        # Time spent on the primary flight path, then ki = m*L1/(hbar*t)
+        shape = np.broadcast_shapes(np.shape(tof), np.shape(t2))
+        ki = np.empty(shape)
+        hw = np.empty(shape)
+        np.subtract(tof, t2, out=ki)
+        np.subtract(ki, self.t0, out=ki)
+        np.divide(self.L1 * self._v_to_k, ki, out=ki)
+        
+        self._conv.convert(ki, 'k', 'E', out=hw)
+        np.subtract(hw, Ef, out=hw)
+        Q = self._Q(kf, ki, cos_two_theta, np.empty(shape))
+        return Q, hw
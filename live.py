@@ -0,0 +1,260 @@
+"""
+Live reduction of events arriving during a run
+"""
+import asyncio
+import struct
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constants import converter
+from events import UniformHistogram
+from tof import tof_to_v
+
+Snapshot = namedtuple('Snapshot', ['n_events', 'n_batches', 'edges', 'counts',
+                                   'n_outside'])
+Snapshot.__doc__ = """
+State of an `EventAccumulator` at one moment; `edges`, `counts` and
+`n_outside` are dicts keyed by histogram name
+"""
+
+
+class EventAccumulator:
+    """
+    Incrementally convert and histogram batches of time-of-flight events
+    
+    Each batch is converted to velocity once and from there to the quantity
+    of every histogram, then added to the histograms and running totals.
+    Earlier events are never reprocessed, and a consistent snapshot can be
+    taken at any moment, also from another thread.
+    
+    Parameters
+    ----------
+    histograms : dict
+        Histograms to fill, mapping a name to (quantity, lo, hi, n_bins)
+        with quantity one of `constants.QUANTITIES`, e.g.
+        {'lambda': ('lambda', 1e-10, 6e-10, 500)}
+    L : float or array
+        Flight path length [m], or one per pixel if batches come with
+        pixel indices
+    t0 : float, optional
+        Time-of-flight offset [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    
+    Attributes
+    ----------
+    n_events : int
+        Number of events added
+    n_batches : int
+        Number of batches added
+    """
+    def __init__(self, histograms, L, t0=0.0, species='n'):
+        self.L = L
+        self.t0 = t0
+        self.species = species
+        self._conv = converter(species)
+        self._histograms = {name: (dst, UniformHistogram(lo, hi, n_bins))
+                            for name, (dst, lo, hi, n_bins)
+                            in histograms.items()}
+        self.n_events = 0
+        self.n_batches = 0
+        self._lock = threading.Lock()
+        self._v = np.empty(0)
+        self._y = np.empty(0)
+    
+    def add(self, tof, pixel=None):
+        """
+        Add a batch of events
+        
+        Parameters
+        ----------
+        tof : array
+            Time of flight of each event [s]
+        pixel : array of int, optional
+            Pixel index of each event, used to look up per-pixel flight
+            paths; ignored for a single flight path (default: None)
+        """
+        tof = np.asarray(tof).reshape(-1)
+        if pixel is None or np.ndim(self.L) == 0:
+            L = self.L
+        else:
+            L = np.take(self.L, pixel)
+        with self._lock:
+            if self._v.size < tof.size:
+                self._v = np.empty(tof.size)
+                self._y = np.empty(tof.size)
+            v = self._v[:tof.size]
+            y = self._y[:tof.size]
+            tof_to_v(tof, L, self.t0, v)
+            for dst, hist in self._histograms.values():
+                hist.add(self._conv.convert(v, 'v', dst, y))
+            self.n_events += tof.size
+            self.n_batches += 1
+    
+    def snapshot(self):
+        """
+        Copy of the current histograms and totals
+        
+        Returns
+        -------
+        snapshot : Snapshot
+            Event and batch counts, and the edges, counts and number of
+            events outside the range of every histogram
+        """
+        with self._lock:
+            return Snapshot(
+                self.n_events, self.n_batches,
+                {name: hist.edges for name, (_, hist)
+                 in self._histograms.items()},
+                {name: hist.counts.copy() for name, (_, hist)
+                 in self._histograms.items()},
+                {name: hist.n_outside for name, (_, hist)
+                 in self._histograms.items()})
+
+
+# Event packets: a little-endian uint32 event count followed by the events
+PACKET_HEADER = struct.Struct('<I')
+EVENT_DTYPE = np.dtype([('tof', '<f8'), ('pixel', '<u4')])
+
+def encode_packet(tof, pixel):
+    """
+    Encode events as a packet
+    
+    Parameters
+    ----------
+    tof : array
+        Time of flight of each event [s]
+    pixel : array of int
+        Pixel index of each event
+    
+    Returns
+    -------
+    packet : bytes
+        Header and events
+    """
+    events = np.empty(len(tof), dtype=EVENT_DTYPE)
+    events['tof'] = tof
+    events['pixel'] = pixel
+    return PACKET_HEADER.pack(events.size) + events.tobytes()
+
+async def _read_batches(reader, queue, batch_size):
+    """
+    Read packets and put batches of at least `batch_size` events on `queue`
+    
+    Waiting on the bounded queue stops reading from the stream, which
+    pushes back on the publisher. None is put on the queue when reading
+    stops, also if the stream breaks off inside a packet, in which case the
+    complete packets read so far are put first and the error is raised.
+    """
+    parts = []
+    n = 0
+    try:
+        while True:
+            try:
+                header = await reader.readexactly(PACKET_HEADER.size)
+            except asyncio.IncompleteReadError as e:
+                # A clean end of stream falls between packets
+                if e.partial:
+                    raise
+                break
+            count, = PACKET_HEADER.unpack(header)
+            payload = await reader.readexactly(count * EVENT_DTYPE.itemsize)
+            parts.append(np.frombuffer(payload, dtype=EVENT_DTYPE))
+            n += count
+            if n >= batch_size:
+                await queue.put(np.concatenate(parts))
+                parts = []
+                n = 0
+    except Exception:
+        await _finish_batches(queue, parts)
+        raise
+    await _finish_batches(queue, parts)
+
+async def _finish_batches(queue, parts):
+    if parts:
+        await queue.put(np.concatenate(parts))
+    await queue.put(None)
+
+async def consume(reader, accumulator, batch_size=2**16, max_pending=4):
+    """
+    Feed events from a stream of packets into an accumulator
+    
+    Packets are read without blocking the event loop and batched; the
+    batches are converted and histogrammed on a worker thread. At most
+    `max_pending` batches wait for the worker, after which reading pauses.
+    
+    Parameters
+    ----------
+    reader : asyncio.StreamReader
+        Stream of packets, see `encode_packet`
+    accumulator : EventAccumulator
+        Accumulator the events are added to
+    batch_size : int, optional
+        Events collected before a batch is handed to the worker
+        (default: 2**16)
+    max_pending : int, optional
+        Largest number of batches waiting for the worker (default: 4)
+    
+    Returns
+    -------
+    n_events : int
+        Number of events consumed before the end of the stream
+    
+    Raises
+    ------
+    asyncio.IncompleteReadError
+        If the stream ends inside a packet, after the complete packets
+        before it have been added
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_pending)
+    producer = asyncio.create_task(_read_batches(reader, queue, batch_size))
+    n_events = 0
+    with ThreadPoolExecutor(max_workers=1) as worker:
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                await loop.run_in_executor(worker, accumulator.add,
+                                           batch['tof'], batch['pixel'])
+                n_events += batch.size
+        except BaseException:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            raise
+    # The producer has finished after the sentinel; awaiting it re-raises
+    # an error from a broken stream
+    await producer
+    return n_events
+
+async def consume_socket(path, accumulator, batch_size=2**16, max_pending=4):
+    """
+    Feed events from a local (Unix domain) socket into an accumulator
+    
+    Parameters
+    ----------
+    path : str
+        Path of the socket the acquisition system publishes on
+    accumulator : EventAccumulator
+        Accumulator the events are added to
+    batch_size : int, optional
+        Events collected before a batch is handed to the worker
+        (default: 2**16)
+    max_pending : int, optional
+        Largest number of batches waiting for the worker (default: 4)
+    
+    Returns
+    -------
+    n_events : int
+        Number of events consumed before the publisher closed the socket
+    """
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        return await consume(reader, accumulator, batch_size, max_pending)
+    finally:
+        writer.close()
+        await writer.wait_closed()
@@ -0,0 +1,85 @@
+"""
+Multi-threaded evaluation of conversions on large arrays
+
+NumPy ufuncs release the GIL, so large arrays are split into cache-sized
+chunks that are converted concurrently on a thread pool. Arrays smaller than
+`THRESHOLD` are converted serially, where the thread overhead would dominate.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from constants import converter
+
+THRESHOLD = 2**20  # Smallest array converted in parallel [elements]
+CHUNK = 2**16      # Elements per task, 512 KiB of float64
+
+_executors = {}
+
+def _executor(threads):
+    """
+    Get the shared thread pool with `threads` workers
+    """
+    try:
+        return _executors[threads]
+    except KeyError:
+        pool = ThreadPoolExecutor(max_workers=threads)
+        _executors[threads] = pool
+        return pool
+
+
+def convert(x, src, dst, species='n', out=None, threads=None, chunk=CHUNK,
+            threshold=THRESHOLD):
+    """
+    Convert between any pair of quantities using several threads
+    
+    Parameters
+    ----------
+    x : float or array
+        Values of the source quantity
+    src, dst : str
+        Source and destination quantities, see `constants.convert`
+    species : str or array of int, optional
+        Particle species, or species code of each element; arrays of codes
+        are converted serially (default: 'n')
+    out : array, optional
+        Array to write the result into, may be `x` (default: None)
+    threads : int, optional
+        Number of worker threads (default: number of CPUs)
+    chunk : int, optional
+        Number of elements converted per task (default: `CHUNK`)
+    threshold : int, optional
+        Arrays with fewer elements are converted serially
+        (default: `THRESHOLD`)
+    
+    Returns
+    -------
+    y : float or array
+        Values of the destination quantity
+    """
+    conv = converter(species)
+    if threads is None:
+        threads = os.cpu_count() or 1
+    x_arr = np.asarray(x)
+    if (threads == 1 or x_arr.size < threshold
+            or not isinstance(species, str)):
+        return conv.convert(x, src, dst, out)
+    
+    if out is None:
+        out = np.empty(x_arr.shape, np.result_type(x_arr.dtype, 1.0))
+    elif out.shape != x_arr.shape or not out.flags.c_contiguous:
+        # Chunks are taken from the flattened arrays, so fall back to a
+        # serial conversion for outputs that cannot be flattened in place
+        return conv.convert(x, src, dst, out)
+    x_flat = x_arr.reshape(-1)
+    out_flat = out.reshape(-1)
+    
+    def task(start):
+        stop = start + chunk
+        conv.convert(x_flat[start:stop], src, dst, out_flat[start:stop])
+    
+    # Consume the iterator so that exceptions in the workers propagate
+    for _ in _executor(threads).map(task, range(0, x_flat.size, chunk)):
+        pass
+    return out
@@ -0,0 +1,107 @@
+"""
+Parallel reduction of many run files on a process pool
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from events import histogram_events
+
+RunReduction = namedtuple('RunReduction', ['edges', 'counts', 'n_outside'])
+RunReduction.__doc__ = """
+Histograms of a series of runs: the common bin `edges`, `counts` with one
+row per run and the number of events outside the range in each run
+"""
+
+
+def _reduce_run(shm_name, shape, row, path, dtype, kwargs):
+    """
+    Histogram one run file into its row of the shared accumulator
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        result = np.ndarray(shape, dtype=np.int64, buffer=shm.buf)
+        if os.path.getsize(path):
+            events = np.memmap(path, dtype=dtype, mode='r')
+        else:
+            events = np.empty(0, dtype=dtype)
+        hist = histogram_events(events, **kwargs)
+        result[row, :-1] = hist.counts
+        result[row, -1] = hist.n_outside
+        del result
+    finally:
+        shm.close()
+
+def reduce_runs(paths, lo, hi, n_bins, src='tof', dst='lambda', species='n',
+                L=None, t0=0.0, dtype=np.float64, processes=None,
+                chunk=2**16):
+    """
+    Convert and histogram a series of run files in parallel
+    
+    Each run is read with `np.memmap`, converted and histogrammed in chunks
+    by a worker process (see `events.histogram_events`), which writes its
+    histogram into its own row of a shared-memory array. Only file names and
+    parameters are sent to the workers and no arrays are pickled. The rows
+    are in the order of `paths`, so the result does not depend on which
+    worker finishes first.
+    
+    Parameters
+    ----------
+    paths : sequence of str
+        Flat binary event files, one per run
+    lo, hi : float
+        Range of the histograms in the destination quantity
+    n_bins : int
+        Number of uniform bins
+    src : str, optional
+        Source quantity, 'tof' [s] or one of `constants.QUANTITIES`
+        (default: 'tof')
+    dst : str, optional
+        Destination quantity, one of `constants.QUANTITIES`
+        (default: 'lambda')
+    species : str, optional
+        Particle species (default: 'n')
+    L : float, optional
+        Flight path length [m], required if `src` is 'tof'
+    t0 : float, optional
+        Time-of-flight offset [s] (default: 0)
+    dtype : data-type, optional
+        Data type of the values in the files (default: np.float64)
+    processes : int, optional
+        Number of worker processes (default: number of CPUs)
+    chunk : int, optional
+        Number of events converted at a time (default: 2**16)
+    
+    Returns
+    -------
+    reduction : RunReduction
+        Bin edges, counts of shape (n_runs, n_bins) and events outside the
+        range of each run; `counts.sum(axis=0)` is the merged histogram
+    """
+    if src == 'tof' and L is None:
+        raise ValueError("The flight path L is required for 'tof' events")
+    kwargs = dict(lo=lo, hi=hi, n_bins=n_bins, src=src, dst=dst,
+                  species=species, L=L, t0=t0, chunk=chunk)
+    shape = (len(paths), n_bins + 1)
+    edges = np.linspace(lo, hi, n_bins + 1)
+    if not paths:
+        return RunReduction(edges, np.zeros((0, n_bins), dtype=np.int64),
+                            np.zeros(0, dtype=np.int64))
+    
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=int(np.prod(shape)) * 8)
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_reduce_run, shm.name, shape, row, path,
+                                   np.dtype(dtype), kwargs)
+                       for row, path in enumerate(paths)]
+            for future in futures:
+                future.result()
+        result = np.ndarray(shape, dtype=np.int64, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return RunReduction(edges, result[:, :-1], result[:, -1])
@@ -0,0 +1,263 @@
+"""
+Transformation of binned spectra between wavelength, energy, momentum,
+wavevector, velocity and time-of-flight axes
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from constants import converter
+from tof import tof_to_v
+
+# Axes a spectrum can be transformed between, see `constants.QUANTITIES`
+AXES = ('E', 'lambda', 'p', 'k', 'v', 'tof')
+
+# Every axis is a power law of energy, q - q0 = a*E**n, with q0 = t0 for
+# time of flight and 0 otherwise
+_EXPONENTS = {'E': 1.0, 'lambda': -0.5, 'p': 0.5, 'k': 0.5, 'v': 0.5,
+              'tof': -0.5}
+
+
+def _check_axes(src, dst, L):
+    for axis in (src, dst):
+        if axis not in _EXPONENTS:
+            raise ValueError(f"Unknown axis: {axis}. Use one of {AXES}")
+    if L is None and 'tof' in (src, dst):
+        raise ValueError("The flight path L is required for the 'tof' axis")
+
+def convert_axis(x, src, dst, species='n', L=None, t0=0.0):
+    """
+    Convert axis values between any pair of axes
+    
+    Parameters
+    ----------
+    x : float or array
+        Values on the source axis
+    src, dst : str
+        Source and destination axes, one of `AXES`
+    species : str, optional
+        Particle species (default: 'n')
+    L : float or array, optional
+        Flight path length [m], required for the 'tof' axis
+    t0 : float or array, optional
+        Time-of-flight offset [s] (default: 0)
+    
+    Returns
+    -------
+    y : float or array
+        Values on the destination axis
+    """
+    _check_axes(src, dst, L)
+    conv = converter(species)
+    if src == 'tof':
+        x = tof_to_v(x, L, t0)
+        src = 'v'
+    if dst == 'tof':
+        return L / conv.convert(x, src, 'v') + t0
+    return conv.convert(x, src, dst)
+
+def jacobian(x, src, dst, species='n', L=None, t0=0.0):
+    """
+    Analytic Jacobian |d src / d dst| of an axis transformation
+    
+    With q - q0 = a*E**n on every axis, |d src / d dst| reduces to
+    |n_src (x - x0)| / |n_dst (y - y0)|.
+    
+    Parameters
+    ----------
+    x : float or array
+        Values on the source axis
+    src, dst : str
+        Source and destination axes, one of `AXES`
+    species : str, optional
+        Particle species (default: 'n')
+    L : float or array, optional
+        Flight path length [m], required for the 'tof' axis
+    t0 : float or array, optional
+        Time-of-flight offset [s] (default: 0)
+    
+    Returns
+    -------
+    J : float or array
+        Jacobian at `x`
+    """
+    y = convert_axis(x, src, dst, species, L, t0)
+    x0 = t0 if src == 'tof' else 0.0
+    y0 = t0 if dst == 'tof' else 0.0
+    scale = abs(_EXPONENTS[src] / _EXPONENTS[dst])
+    return scale * np.abs((x - x0) / (y - y0))
+
+def transform_spectrum(x, intensity, src, dst, species='n', L=None, t0=0.0,
+                       errors=None, density=True):
+    """
+    Transform spectra from one axis to another
+    
+    `x` may hold bin edges, one more than the number of bins, or point
+    positions, one per bin. For point data the intensities are multiplied
+    by the analytic Jacobian at each point; for histograms by the ratio of
+    bin widths, the exact bin average of the same Jacobian, so integrals are
+    conserved. The result is ordered with an increasing destination axis.
+    A whole (spectra x bins) block is transformed at once.
+    
+    Parameters
+    ----------
+    x : array, shape (..., n_bins + 1) or (..., n_bins)
+        Bin edges or points on the source axis, shared by all spectra or
+        one row per spectrum
+    intensity : array, shape (..., n_bins)
+        Intensity per unit of the source axis, or counts per bin if
+        `density` is False
+    src, dst : str
+        Source and destination axes, one of `AXES`
+    species : str, optional
+        Particle species (default: 'n')
+    L : float or array, optional
+        Flight path length [m], required for the 'tof' axis. Per-spectrum
+        values need a trailing axis, shape (n_spectra, 1)
+    t0 : float or array, optional
+        Time-of-flight offset [s] (default: 0)
+    errors : array, shape (..., n_bins), optional
+        Uncertainties on `intensity`, transformed in the same way
+    density : bool, optional
+        If True, `intensity` is per unit axis and is multiplied by the
+        Jacobian; if False it holds counts per bin and is only reordered
+        (default: True)
+    
+    Returns
+    -------
+    y : array
+        Bin edges or points on the destination axis
+    intensity : array
+        Transformed intensity
+    errors : array
+        Transformed uncertainties, only returned if `errors` is given
+    """
+    x = np.asarray(x)
+    intensity = np.asarray(intensity)
+    n_bins = intensity.shape[-1]
+    y = convert_axis(x, src, dst, species, L, t0)
+    
+    if not density:
+        factor = None
+    elif x.shape[-1] == n_bins + 1:
+        factor = np.diff(x, axis=-1) / np.diff(y, axis=-1)
+        np.abs(factor, out=factor)
+    elif x.shape[-1] == n_bins:
+        factor = jacobian(x, src, dst, species, L, t0)
+    else:
+        raise ValueError(f"x has {x.shape[-1]} values along the last axis, "
+                         f"expected {n_bins + 1} edges or {n_bins} points")
+    
+    result = [y, intensity if factor is None else intensity * factor]
+    if errors is not None:
+        errors = np.asarray(errors)
+        result.append(errors if factor is None else errors * factor)
+    
+    # Decreasing transformations, e.g. wavelength to energy, reverse the axis
+    if _EXPONENTS[src] * _EXPONENTS[dst] < 0:
+        result = [a[..., ::-1] for a in result]
+    return tuple(result)
+
+
+@lru_cache(maxsize=64)
+def _overlap_weights(src_key, dst_key):
+    src = np.frombuffer(src_key)
+    dst = np.frombuffer(dst_key)
+    
+    # Split the common range at every edge of either grid; each piece lies
+    # in exactly one source and one destination bin
+    lo = max(src[0], dst[0])
+    hi = min(src[-1], dst[-1])
+    pieces = np.union1d(src, dst)
+    pieces = pieces[(pieces >= lo) & (pieces <= hi)]
+    mid = 0.5 * (pieces[:-1] + pieces[1:])
+    i_src = np.searchsorted(src, mid) - 1
+    i_dst = np.searchsorted(dst, mid) - 1
+    weight = np.diff(pieces) / np.diff(src)[i_src]
+    
+    # Pieces are ordered by destination bin, so each bin is a contiguous run
+    starts = np.flatnonzero(np.diff(i_dst, prepend=-1))
+    for a in (i_src, weight, starts):
+        a.flags.writeable = False
+    return i_src, weight, starts, i_dst[starts]
+
+def rebin_weights(edges, new_edges):
+    """
+    Overlap weights for rebinning from one grid to another
+    
+    Weights are cached for repeated pairs of grids.
+    
+    Parameters
+    ----------
+    edges : array, shape (n_bins + 1,)
+        Increasing source bin edges
+    new_edges : array, shape (n_new + 1,)
+        Increasing destination bin edges
+    
+    Returns
+    -------
+    i_src : array of int
+        Source bin of each overlap
+    weight : array
+        Fraction of the source bin in the overlap
+    starts : array of int
+        Index of the first overlap of each destination bin that has any
+    i_dst : array of int
+        Destination bin starting at each of `starts`
+    """
+    edges = np.ascontiguousarray(edges, dtype=np.float64)
+    new_edges = np.ascontiguousarray(new_edges, dtype=np.float64)
+    for e in (edges, new_edges):
+        if e.ndim != 1 or e.size < 2 or np.any(np.diff(e) <= 0):
+            raise ValueError("Bin edges must be 1D and strictly increasing")
+    return _overlap_weights(edges.tobytes(), new_edges.tobytes())
+
+def rebin(edges, counts, new_edges, errors=None):
+    """
+    Rebin a block of histograms onto a new grid, conserving counts
+    
+    Counts in each source bin are shared between the destination bins in
+    proportion to their overlap, assuming a flat distribution within the
+    bin. Counts outside the new grid are dropped. All spectra are rebinned
+    in one vectorized pass.
+    
+    Parameters
+    ----------
+    edges : array, shape (n_bins + 1,)
+        Increasing source bin edges, shared by all spectra
+    counts : array, shape (..., n_bins)
+        Counts per bin
+    new_edges : array, shape (n_new + 1,)
+        Increasing destination bin edges
+    errors : array, shape (..., n_bins), optional
+        Uncertainties on `counts`, assumed independent between bins
+    
+    Returns
+    -------
+    counts : array, shape (..., n_new)
+        Rebinned counts
+    errors : array, shape (..., n_new)
+        Rebinned uncertainties, only returned if `errors` is given
+    """
+    i_src, weight, starts, i_dst = rebin_weights(edges, new_edges)
+    counts = np.asarray(counts)
+    shape = counts.shape[:-1] + (len(new_edges) - 1,)
+    
+    new_counts = np.zeros(shape, np.result_type(counts, 1.0))
+    if i_src.size:
+        contrib = np.take(counts, i_src, axis=-1).astype(new_counts.dtype,
+                                                         copy=False)
+        contrib *= weight
+        new_counts[..., i_dst] = np.add.reduceat(contrib, starts, axis=-1)
+    if errors is None:
+        return new_counts
+    
+    new_errors = np.zeros(shape, np.result_type(errors, 1.0))
+    if i_src.size:
+        contrib = np.take(errors, i_src, axis=-1).astype(new_errors.dtype,
+                                                         copy=False)
+        contrib *= weight
+        np.square(contrib, out=contrib)
+        new_errors[..., i_dst] = np.sqrt(np.add.reduceat(contrib, starts,
+                                                         axis=-1))
+    return new_counts, new_errors
@@ -0,0 +1,102 @@
+"""
+Time-of-flight conversions
+
+All functions broadcast over the time of flight, the flight path and the
+offset, so per-pixel flight paths convert a whole detector bank in one call,
+e.g. `tof_to_lambda(tof, L[pixel])` for event data or
+`tof_to_lambda(tof[None, :], L[:, None])` for per-pixel histograms.
+"""
+import numpy as np
+
+from constants import converter
+
+
+def _is_scalar(x):
+    return isinstance(x, (float, int, np.generic))
+
+def _reuse(velocity):
+    # Convert the velocity in place rather than allocating a second array
+    return velocity if isinstance(velocity, np.ndarray) else None
+
+
+def tof_to_v(tof, L, t0=0.0, out=None):
+    """
+    Convert time of flight to velocity
+    
+    Parameters
+    ----------
+    tof : float or array
+        Time of flight [s]
+    L : float or array
+        Flight path length [m]
+    t0 : float or array, optional
+        Time offset subtracted from `tof` [s] (default: 0)
+    out : array, optional
+        Array to write the result into, must have the broadcast shape of
+        the inputs (default: None)
+    
+    Returns
+    -------
+    velocity : float or array
+        Velocity [m/s]
+    """
+    if out is None:
+        if _is_scalar(tof) and _is_scalar(L) and _is_scalar(t0):
+            return L / (tof - t0)
+        shape = np.broadcast_shapes(np.shape(tof), np.shape(L), np.shape(t0))
+        out = np.empty(shape, np.result_type(tof, L, t0, 1.0))
+    np.subtract(tof, t0, out=out)
+    return np.divide(L, out, out=out)
+
+def tof_to_lambda(tof, L, t0=0.0, species='n', out=None):
+    """
+    Convert time of flight to wavelength
+    
+    Parameters
+    ----------
+    tof : float or array
+        Time of flight [s]
+    L : float or array
+        Flight path length [m]
+    t0 : float or array, optional
+        Time offset subtracted from `tof` [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    out : array, optional
+        Array to write the result into, must have the broadcast shape of
+        the inputs (default: None)
+    
+    Returns
+    -------
+    wavelength : float or array
+        Wavelength [m]
+    """
+    velocity = tof_to_v(tof, L, t0, out)
+    return converter(species).convert(velocity, 'v', 'lambda',
+                                      _reuse(velocity))
+
+def tof_to_E(tof, L, t0=0.0, species='n', out=None):
+    """
+    Convert time of flight to energy
+    
+    Parameters
+    ----------
+    tof : float or array
+        Time of flight [s]
+    L : float or array
+        Flight path length [m]
+    t0 : float or array, optional
+        Time offset subtracted from `tof` [s] (default: 0)
+    species : str, optional
+        Particle species (default: 'n')
+    out : array, optional
+        Array to write the result into, must have the broadcast shape of
+        the inputs (default: None)
+    
+    Returns
+    -------
+    energy : float or array
+        Energy [meV]
+    """
+    velocity = tof_to_v(tof, L, t0, out)
+    return converter(species).v_to_E(velocity, _reuse(velocity))